@@ -1,26 +1,45 @@
 """
 change_detector.py
 Simple change detector comparing hashes of raw HTML snapshots.
+Hashes only need to detect changes, so the fast non-cryptographic xxh3_64 is used.
 Usage:
   python3 change_detector.py
-It writes/updates changelog.json and a small state file .state_hashes.json
+It appends to changelog.jsonl (one JSON entry per line) and updates a small state file .state_hashes.json
 """
 
 import os
-import hashlib
+import mmap
 import json
+import xxhash
 from glob import glob
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 RAW_DIR = "raw_data"
 STATE_FILE = ".state_hashes.json"
-CHANGELOG = "changelog.json"
+CHANGELOG = "changelog.jsonl"
+# Snapshots at or above this size are hashed through mmap instead of buffered reads
+MMAP_THRESHOLD = 1 << 20
+READ_BUFFER = 1 << 20
+# Stored in the state file; a mismatch invalidates all previously stored hashes
+HASH_ALGO = "xxh3_64"
+MAX_WORKERS = min(8, os.cpu_count() or 1)
 
 def file_hash(path):
-    h = hashlib.sha256()
+    h = xxhash.xxh3_64()
+    st = os.stat(path)
     with open(path, "rb") as f:
+        if st.st_size >= MMAP_THRESHOLD:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    h.update(mm)
+                return h.hexdigest()
+            except (ValueError, OSError):
+                # mmap can fail on empty/special files; fall back to buffered reads
+                h = xxhash.xxh3_64()
+                f.seek(0)
         while True:
-            data = f.read(8192)
+            data = f.read(READ_BUFFER)
             if not data:
                 break
             h.update(data)
@@ -29,21 +48,23 @@ def file_hash(path):
 def load_state():
     if os.path.exists(STATE_FILE):
         with open(STATE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+            state = json.load(f)
+        if state.get("hash_algo") == HASH_ALGO:
+            return state
+        print(f"Hash algorithm changed to {HASH_ALGO}; previous hashes discarded.")
     return {}
 
 def save_state(state):
+    state["hash_algo"] = HASH_ALGO
     with open(STATE_FILE, "w", encoding="utf-8") as f:
         json.dump(state, f, indent=2)
 
 def append_changelog(entry):
-    logs = []
-    if os.path.exists(CHANGELOG):
-        with open(CHANGELOG, "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    logs.append(entry)
-    with open(CHANGELOG, "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=2)
+    with open(CHANGELOG, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+def hash_entry(path):
+    return os.path.basename(path), file_hash(path)
 
 def run():
     os.makedirs(RAW_DIR, exist_ok=True)
@@ -53,9 +74,11 @@ def run():
         print("No snapshots found in raw_data/. Run fetcher.py first.")
         return
     changed = False
-    for path in files:
-        h = file_hash(path)
-        name = os.path.basename(path)
+    # Hashing releases the GIL, so files are hashed concurrently;
+    # state and changelog updates stay on the main thread.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        hashes = list(ex.map(hash_entry, files))
+    for name, h in hashes:
         old = state.get(name)
         if old != h:
             print("Change detected:", name)
@@ -4,12 +4,13 @@ CapriAI - Splits cleaned text files from 'extracted' into overlapping chunks rea
 Usage:
   1. Ensure 'extracted' folder contains .txt files (created by extractor.py).
   2. Run: python3 chunker.py
-  3. Chunk JSON files will be written to the 'chunks' folder.
+  3. One Parquet file per source (one row per chunk) will be written to the 'chunks' folder.
 """
 
 import os
 import glob
-import json
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime
 
 EXTRACTED_DIR = "extracted"
@@ -21,38 +22,36 @@ OVERLAP = 600
 os.makedirs(CHUNKS_DIR, exist_ok=True)
 
 def chunk_text(text, size=CHUNK_SIZE, overlap=OVERLAP):
-    chunks = []
-    start = 0
-    text_length = len(text)
-    while start < text_length:
-        end = start + size
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start = end - overlap
-        if start < 0:
-            start = 0
-    return chunks
+    offsets = range(0, len(text), size - overlap)
+    return [text[o:o + size] for o in offsets]
+
+def remove_stale_outputs(base):
+    """Delete chunk files for base written by older formats (per-chunk JSON, per-source JSONL),
+    so ingest doesn't read the same chunk ids twice with different texts."""
+    stale = glob.glob(os.path.join(CHUNKS_DIR, glob.escape(base) + "__chunk*.json"))
+    stale.append(os.path.join(CHUNKS_DIR, f"{base}.jsonl"))
+    for path in stale:
+        if os.path.exists(path):
+            os.remove(path)
 
 def process_file(path):
     with open(path, "r", encoding="utf-8") as f:
         text = f.read()
     base = os.path.basename(path).rsplit(".", 1)[0]
     chunks = chunk_text(text)
-    outputs = []
-    for i, c in enumerate(chunks):
-        meta = {
-            "chunk_id": f"{base}__chunk{i}",
-            "source": base,
-            "chunk_index": i,
-            "fetch_date": None,
-            "generated_at": datetime.utcnow().isoformat() + "Z",
-            "text": c
-        }
-        out_path = os.path.join(CHUNKS_DIR, f"{meta['chunk_id']}.json")
-        with open(out_path, "w", encoding="utf-8") as fo:
-            json.dump(meta, fo, ensure_ascii=False)
-        outputs.append(out_path)
-    return outputs
+    remove_stale_outputs(base)
+    n = len(chunks)
+    # All chunks of a source go into one columnar Parquet file instead of per-chunk JSON
+    table = pa.table({
+        "chunk_id": [f"{base}__chunk{i}" for i in range(n)],
+        "source": [base] * n,
+        "chunk_index": list(range(n)),
+        "generated_at": [datetime.utcnow().isoformat() + "Z"] * n,
+        "text": chunks,
+    })
+    out_path = os.path.join(CHUNKS_DIR, f"{base}.parquet")
+    pq.write_table(table, out_path, compression="zstd")
+    return len(chunks)
 
 def run_all():
     files = glob.glob(os.path.join(EXTRACTED_DIR, "*.txt"))
@@ -61,9 +60,9 @@ def run_all():
         return
     total = 0
     for path in files:
-        outs = process_file(path)
-        print(f"[+] Created {len(outs)} chunks from {os.path.basename(path)}")
-        total += len(outs)
+        n = process_file(path)
+        print(f"[+] Created {n} chunks from {os.path.basename(path)}")
+        total += n
     print(f"--- Chunking complete: {total} chunks created ---")
 
 if __name__ == "__main__":
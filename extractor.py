@@ -4,12 +4,15 @@ CapriAI - Cleans HTML snapshots saved by fetcher.py and writes plain text files.
 Usage:
   1. Place HTML files into the 'raw_data' folder (fetcher.py does this).
   2. Run: python3 extractor.py
-  3. Cleaned text files will be written to the 'extracted' folder.
+  3. Cleaned text files will be written to the 'extracted' folder, each with a .hash
+     sidecar (source HTML + extractor version) so unchanged snapshots are skipped on re-runs.
 """
 
 import os
 import glob
-from bs4 import BeautifulSoup
+import xxhash
+from multiprocessing import Pool
+from selectolax.lexbor import LexborHTMLParser
 from datetime import datetime
 
 RAW_DIR = "raw_data"
@@ -17,63 +20,83 @@ OUT_DIR = "extracted"
 
 os.makedirs(OUT_DIR, exist_ok=True)
 
+# Common noisy tags, plus site banners and cookie notices matched by id/class heuristics
+NOISE_TAGS = ["script", "style", "nav", "footer", "aside", "header", "form", "noscript"]
+NOISE_ATTRS = ["cookie", "consent", "banner", "modal", "subscribe", "newsletter", "promo", "advert"]
+# Built once so noise removal is a single pass over the parsed tree
+NOISE_SEL = ",".join(NOISE_TAGS + [f"[id*='{a}'],[class*='{a}']" for a in NOISE_ATTRS])
+
+# Bump when clean_html changes so cached extractions are redone; NOISE_SEL changes are picked up automatically
+EXTRACTOR_VERSION = "1"
+CACHE_SALT = xxhash.xxh3_64_hexdigest(f"{EXTRACTOR_VERSION}:{NOISE_SEL}".encode("utf-8"))
+
 def clean_html(html):
     """Return cleaned, readable text from raw HTML."""
-    soup = BeautifulSoup(html, "html.parser")
+    tree = LexborHTMLParser(html)
 
-    # Remove common noisy tags
-    for selector in ["script", "style", "nav", "footer", "aside", "header", "form", "noscript"]:
-        for tag in soup.select(selector):
-            tag.decompose()
-
-    # Remove common site banners and cookie notices by id/class heuristics
-    for attr in ["cookie", "consent", "banner", "modal", "subscribe", "newsletter", "promo", "advert"]:
-        for tag in soup.select(f"[id*='{attr}']"):
-            tag.decompose()
-        for tag in soup.select(f"[class*='{attr}']"):
-            tag.decompose()
+    # Remove noisy tags, banners and cookie notices. The <html> element can match the
+    # id/class heuristics (e.g. class="cookie-consent-pending") but cannot be decomposed.
+    for node in tree.css(NOISE_SEL):
+        if node.tag != "html":
+            node.decompose()
 
     # Prefer main/article sections if present
-    main = soup.find("main") or soup.find("article")
-    if main:
-        text_source = main
-    else:
-        text_source = soup
-
-    # Collect headings and paragraphs
-    lines = []
-    for elem in text_source.find_all(["h1","h2","h3","h4","p","li"]):
-        line = elem.get_text(separator=' ', strip=True)
-        if line:
-            lines.append(line)
+    text_source = tree.css_first("main") or tree.css_first("article") or tree.root
+
+    # Collect headings and paragraphs, joined straight from the node iterator
+    cleaned = "\n\n".join(
+        line
+        for elem in text_source.css("h1,h2,h3,h4,p,li")
+        if (line := elem.text(separator=' ', strip=True, skip_empty=True).strip())
+    )
 
     # Fallback: if no lines found, get all text
-    if not lines:
-        text = text_source.get_text(separator='\n', strip=True)
-        lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    if not cleaned:
+        text = text_source.text(separator='\n', strip=True, skip_empty=True)
+        cleaned = "\n\n".join(ln.strip() for ln in text.splitlines() if ln.strip())
 
-    # Join and normalize whitespace
-    cleaned = "\n\n".join(lines)
     return cleaned
 
+def read_hash(hash_path):
+    """Return the source hash recorded for a previous extraction, or None."""
+    try:
+        with open(hash_path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
 def process_file(path):
+    base = os.path.basename(path).rsplit(".",1)[0]
+    out_path = os.path.join(OUT_DIR, base + ".txt")
+    hash_path = os.path.join(OUT_DIR, base + ".hash")
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            html = f.read()
+        with open(path, "rb") as f:
+            raw = f.read()
+        # Same xxh3_64 digest change_detector records for raw snapshots, keyed by extractor config
+        cache_key = f"{CACHE_SALT}:{xxhash.xxh3_64_hexdigest(raw)}"
+        if os.path.exists(out_path) and read_hash(hash_path) == cache_key:
+            print(f"[=] Unchanged, skipped: {out_path}")
+            return
+        html = raw.decode("utf-8")
     except Exception as e:
         print(f"[!] Failed to read {path}: {e}")
         return
 
-    text = clean_html(html)
+    try:
+        text = clean_html(html)
+    except Exception as e:
+        # One unparseable page must not abort the whole worker pool
+        print(f"[!] Failed to extract {path}: {e}")
+        return
     if not text or len(text) < 50:
         print(f"[!] Warning: extracted text seems very short for {os.path.basename(path)}")
 
-    base = os.path.basename(path).rsplit(".",1)[0]
-    out_path = os.path.join(OUT_DIR, base + ".txt")
     try:
         with open(out_path, "w", encoding="utf-8") as fo:
             fo.write(f"<!-- source: {base}  extracted: {datetime.utcnow().isoformat()} UTC -->\n\n")
             fo.write(text)
+        with open(hash_path, "w", encoding="utf-8") as fo:
+            fo.write(cache_key)
         print(f"[+] Extracted: {out_path}")
     except Exception as e:
         print(f"[!] Failed to write {out_path}: {e}")
@@ -83,8 +106,10 @@ def run_all():
     if not files:
         print(f"No HTML files found in '{RAW_DIR}'. Run fetcher.py first.")
         return
-    for path in files:
-        process_file(path)
+    # Parsing is CPU-bound, so spread snapshots across worker processes
+    with Pool() as pool:
+        for _ in pool.imap_unordered(process_file, files, chunksize=4):
+            pass
 
 if __name__ == "__main__":
     run_all()
@@ -7,8 +7,12 @@ import csv
 import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import os
 
+# Fetching is I/O-bound, so pages are requested concurrently
+MAX_WORKERS = 16
+
 # Folder to store raw HTML snapshots
 os.makedirs("raw_data", exist_ok=True)
 
@@ -33,11 +37,11 @@ def save_snapshot(url, content):
 
 def main():
     with open("capriAI_sources_updated.csv", newline="", encoding="utf-8") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            url = row["url"]
-            print(f"Fetching: {url}")
-            content = fetch_page(url)
+        urls = [row["url"] for row in csv.DictReader(csvfile)]
+    for url in urls:
+        print(f"Fetching: {url}")
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        for url, content in zip(urls, ex.map(fetch_page, urls)):
             if content:
                 save_snapshot(url, content)
 
@@ -0,0 +1,16 @@
+"""
+gunicorn_conf.py
+Gunicorn settings for retriever_api.py. Requests are I/O-bound (OpenAI + Pinecone
+round-trips), so gevent workers serve many in-flight queries per process.
+The gevent worker monkey-patches the standard library before loading the app.
+Usage:
+  gunicorn -c gunicorn_conf.py retriever_api:app
+"""
+
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8080")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "gevent"
+worker_connections = 200
+timeout = 60
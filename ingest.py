@@ -1,11 +1,12 @@
 """
 Ingest script (safe to upload to GitHub)
-- reads chunk JSON files from ./chunks (each file is expected to contain an object with 'id' and 'text' or similar)
+- reads chunk Parquet/JSON/JSONL files from ./chunks (each file is expected to contain objects with 'id' or 'chunk_id' and 'text' or similar)
 - creates embeddings using OpenAI's `text-embedding-3-small` via the modern `openai` package (OpenAI client)
-- writes results to embeddings/embeddings.jsonl (jsonlines)
+- writes vectors to embeddings/vectors.npy (float16, one row per chunk) and the matching
+  id/text metadata to embeddings/metadata.jsonl (jsonlines, same order)
 
 Requirements (install in your virtualenv):
-    pip install openai python-dotenv tqdm
+    pip install openai python-dotenv tqdm numpy orjson ijson pyarrow
 
 IMPORTANT:
 - Do NOT store your API key in this file. Put it into a .env file or export OPENAI_API_KEY in your shell.
@@ -21,15 +22,27 @@ This file purposely contains no secrets. Keep your .env in the project root and
 """
 
 import os
-import json
+import orjson
 import time
+import hashlib
 import glob
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from typing import List
 
+import ijson
+import numpy as np
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
 from tqdm import tqdm
 
+# tiktoken is optional (see requirements_no_tiktoken.txt); without it batches are sized by count only
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
 # Modern OpenAI SDK
 from openai import OpenAI
 from openai import OpenAIError
@@ -38,11 +51,18 @@ from openai import OpenAIError
 CHUNKS_DIR = Path("chunks")
 OUT_DIR = Path("embeddings")
 OUT_DIR.mkdir(exist_ok=True)
-OUT_FILE = OUT_DIR / "embeddings.jsonl"
+VECTORS_FILE = OUT_DIR / "vectors.npy"
+METADATA_FILE = OUT_DIR / "metadata.jsonl"
 EMBED_MODEL = "text-embedding-3-small"  # change if you prefer another model
-BATCH_SIZE = 16
+EMBED_DIM = 1536  # output dimension of EMBED_MODEL
+BATCH_SIZE = 128
+MAX_BATCH_TOKENS = 250_000  # the embeddings API rejects requests over 300k tokens in total
+MAX_INPUT_TOKENS = 8191  # ... and any single input over 8191 tokens
+EMBED_WORKERS = 4  # concurrent embedding requests
 MAX_RETRIES = 6
 INITIAL_BACKOFF = 1.0
+# .json files at least this large are streamed with ijson; smaller ones are parsed in one go
+STREAM_MIN_BYTES = 8 * 1024 * 1024
 
 # --- Helpers ---
 
@@ -56,26 +76,74 @@ def load_env():
 
 
 def find_chunk_files(directory: Path) -> List[Path]:
-    # find json files in chunks directory
+    # find parquet, json and jsonl files in chunks directory (one scandir pass, sorted for deterministic ids)
     if not directory.exists():
         return []
-    return sorted(directory.glob("*.json"))
+    with os.scandir(directory) as it:
+        entries = [e for e in it if e.name.endswith((".parquet", ".json", ".jsonl")) and e.is_file()]
+    entries.sort(key=lambda e: e.name)
+    return [Path(e.path) for e in entries]
+
+
+def stream_chunks_array(p: Path):
+    """Yield chunk items from a JSON object's "chunks" array, one at a time.
+
+    Returns the number of array elements seen (0 if the file has no "chunks" array).
+    """
+    seen = 0
+    try:
+        with p.open("rb") as f:
+            # Only a top-level object can hold a "chunks" array; bail out before scanning anything else
+            if next(ijson.parse(f), None) != ("", "start_map", None):
+                return 0
+            f.seek(0)
+            for c in ijson.items(f, "chunks.item"):
+                seen += 1
+                text = c.get("text") or c.get("content") or c.get("body") or c.get("page_text")
+                if text:
+                    yield {"id": c.get("id") or c.get("chunk_id") or c.get("url") or p.stem, "text": text}
+    except ijson.JSONError as e:
+        # not a single JSON document (e.g. line-delimited); only an error if we were mid-array
+        if seen:
+            print(f"WARNING: cannot parse rest of {p} - skipping ({e})")
+    return seen
+
+
+def read_parquet_chunks(p: Path):
+    """Yield chunk items from a Parquet file written by chunker.py, one row batch at a time."""
+    try:
+        for batch in pq.ParquetFile(p).iter_batches(columns=["chunk_id", "text"]):
+            cols = batch.to_pydict()
+            for chunk_id, text in zip(cols["chunk_id"], cols["text"]):
+                if text:
+                    yield {"id": chunk_id or p.stem, "text": text}
+    except Exception as e:
+        print(f"WARNING: cannot read {p} - skipping ({e})")
 
 
 def read_chunk_file(p: Path):
-    """Return a list of dicts with keys: id, text (best-effort)."""
+    """Yield dicts with keys: id, text (best-effort)."""
+    if p.suffix == ".parquet":
+        yield from read_parquet_chunks(p)
+        return
+
+    if p.suffix == ".json" and p.stat().st_size >= STREAM_MIN_BYTES:
+        # Stream "chunks" arrays so large files are never fully loaded into memory
+        if (yield from stream_chunks_array(p)):
+            return
+
     try:
-        raw = json.loads(p.read_text(encoding="utf-8"))
+        data = p.read_bytes()
+        raw = orjson.loads(data)
     except Exception as e:
         # try line-delimited
         try:
-            lines = [json.loads(l) for l in p.read_text(encoding="utf-8").splitlines() if l.strip()]
+            lines = [orjson.loads(l) for l in data.splitlines() if l.strip()]
             raw = lines
         except Exception:
             print(f"WARNING: cannot parse {p} - skipping ({e})")
-            return []
+            return
 
-    items = []
     if isinstance(raw, dict):
         # If file is a single object that contains text or chunks
         # Try several common keys
@@ -83,21 +151,33 @@ def read_chunk_file(p: Path):
             for c in raw["chunks"]:
                 text = c.get("text") or c.get("content") or c.get("body") or c.get("page_text")
                 if text:
-                    items.append({"id": c.get("id") or c.get("url") or p.stem, "text": text})
+                    yield {"id": c.get("id") or c.get("chunk_id") or c.get("url") or p.stem, "text": text}
         else:
             # try to interpret top-level as a single chunk
             text = raw.get("text") or raw.get("content") or raw.get("body") or raw.get("page_text")
             if text:
-                items.append({"id": raw.get("id") or raw.get("url") or p.stem, "text": text})
+                yield {"id": raw.get("id") or raw.get("chunk_id") or raw.get("url") or p.stem, "text": text}
     elif isinstance(raw, list):
+        n = 0
         for obj in raw:
             if not isinstance(obj, dict):
                 continue
             text = obj.get("text") or obj.get("content") or obj.get("body") or obj.get("page_text")
             if text:
-                items.append({"id": obj.get("id") or obj.get("url") or (p.stem + f"_{len(items)}"), "text": text})
+                yield {"id": obj.get("id") or obj.get("chunk_id") or obj.get("url") or (p.stem + f"_{n}"), "text": text}
+                n += 1
 
-    return items
+
+def load_encoder():
+    """Return the tiktoken encoder for EMBED_MODEL, or None if it is unavailable."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(EMBED_MODEL)
+    except Exception as e:
+        # encoding_for_model downloads the BPE file on first use, which fails on offline hosts
+        print(f"WARNING: cannot load tokenizer for {EMBED_MODEL} ({e}) - batching by count only")
+        return None
 
 
 def batches(lst, n):
@@ -105,6 +185,19 @@ def batches(lst, n):
         yield lst[i : i + n]
 
 
+def token_batches(lst, lengths, n, max_tokens):
+    """Greedily pack items into batches of at most n items and max_tokens tokens."""
+    batch, total = [], 0
+    for item, length in zip(lst, lengths):
+        if batch and (len(batch) >= n or total + length > max_tokens):
+            yield batch
+            batch, total = [], 0
+        batch.append(item)
+        total += length
+    if batch:
+        yield batch
+
+
 def create_client():
     # create OpenAI client using OPENAI_API_KEY from env
     api_key = os.getenv("OPENAI_API_KEY")
@@ -153,44 +246,69 @@ def main():
         return
 
     # read chunks
-    all_chunks = []
-    for cf in chunk_files:
-        items = read_chunk_file(cf)
-        all_chunks.extend(items)
+    all_chunks = list(chain.from_iterable(map(read_chunk_file, chunk_files)))
 
     if not all_chunks:
         print("No text chunks could be read from chunk files.")
         return
 
-    print(f"Creating embeddings for {len(all_chunks)} chunks (batch_size={BATCH_SIZE})")
-
-    out_lines = []
-    # process in batches
-    for batch in tqdm(list(batches(all_chunks, BATCH_SIZE)), desc="embedding batches"):
-        texts = [c["text"] for c in batch]
-        ids = [c.get("id") or f"chunk_{i}" for i, c in enumerate(batch)]
+    # Repeated texts (boilerplate that leaked past the extractor) are embedded once
+    # and the vector is fanned out to every chunk that carries that text.
+    uniq = {}
+    for row, c in enumerate(all_chunks):
+        key = hashlib.blake2b(c["text"].encode("utf-8"), digest_size=16).digest()
+        uniq.setdefault(key, []).append(row)
+    groups = list(uniq.values())
+
+    print(f"Creating embeddings for {len(all_chunks)} chunks ({len(groups)} unique texts, batch_size={BATCH_SIZE})")
+
+    # float16 halves storage; precision loss is negligible for cosine similarity at this dimension
+    vectors_arr = np.empty((len(all_chunks), EMBED_DIM), dtype=np.float16)
+    # One input text per group; the encoder (loaded once, tokenizing on Rust threads)
+    # sizes batches and truncates inputs the API would reject.
+    inputs = [all_chunks[rows[0]]["text"] for rows in groups]
+    enc = load_encoder()
+    if enc is not None:
+        tokens = enc.encode_ordinary_batch(inputs, num_threads=os.cpu_count() or 1)
+        for g, toks in enumerate(tokens):
+            if len(toks) > MAX_INPUT_TOKENS:
+                chunk_id = all_chunks[groups[g][0]].get("id")
+                print(f"WARNING: {chunk_id} has {len(toks)} tokens - truncating to {MAX_INPUT_TOKENS} for embedding")
+                inputs[g] = enc.decode(toks[:MAX_INPUT_TOKENS])
+        lengths = [min(len(toks), MAX_INPUT_TOKENS) for toks in tokens]
+        batch_list = list(token_batches(list(zip(groups, inputs)), lengths, BATCH_SIZE, MAX_BATCH_TOKENS))
+    else:
+        batch_list = list(batches(list(zip(groups, inputs)), BATCH_SIZE))
+    # Embedding calls are dominated by HTTP round-trips, so keep several batches in flight.
+    # executor.map yields results in submission order, so each vector lines up with its group.
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as executor:
+        results = executor.map(
+            lambda batch: embed_texts(client, [text for _, text in batch]),
+            batch_list,
+        )
         try:
-            vectors = embed_texts(client, texts)
+            for batch, vectors in tqdm(zip(batch_list, results), total=len(batch_list), desc="embedding batches"):
+                for (rows, _), emb in zip(batch, vectors):
+                    vectors_arr[rows] = np.asarray(emb, dtype=np.float16)
         except Exception as e:
+            executor.shutdown(cancel_futures=True)
             print("ERROR while creating embeddings:", e)
             print("Aborting. Fix the problem (e.g. quota, key) and re-run.")
             return
 
-        for item, emb in zip(batch, vectors):
-            out_obj = {
-                "id": str(item.get("id") or item.get("url") or ""),
-                "text": item.get("text"),
-                "embedding": emb,
-            }
-            out_lines.append(out_obj)
-
-    # write to jsonl
-    with OUT_FILE.open("w", encoding="utf-8") as fh:
-        for o in out_lines:
-            fh.write(json.dumps(o, ensure_ascii=False) + "\n")
-
-    print(f"✅ Completed embeddings for {len(out_lines)} chunks")
-    print(f"✅ Saved to {OUT_FILE}")
+    meta_lines = [
+        {"id": str(item.get("id") or item.get("url") or ""), "text": item.get("text")}
+        for item in all_chunks
+    ]
+
+    # write vectors as .npy and metadata as jsonl (row i of one matches line i of the other)
+    np.save(VECTORS_FILE, vectors_arr)
+    with METADATA_FILE.open("wb") as fh:
+        for o in meta_lines:
+            fh.write(orjson.dumps(o) + b"\n")
+
+    print(f"✅ Completed embeddings for {len(meta_lines)} chunks")
+    print(f"✅ Saved to {VECTORS_FILE} and {METADATA_FILE}")
 
 
 if __name__ == "__main__":
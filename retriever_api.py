@@ -3,9 +3,12 @@
 retriever_api.py
 Simple Flask service that queries Pinecone index given a text query.
 Requires OPENAI_API_KEY to embed the query and PINECONE_API_KEY for Pinecone.
+Run with gunicorn (gevent workers, see gunicorn_conf.py):
+  gunicorn -c gunicorn_conf.py retriever_api:app
 """
 
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify
 from openai import OpenAI
@@ -17,16 +20,25 @@ PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 if not OPENAI_API_KEY or not PINECONE_API_KEY:
     raise SystemExit("Please set OPENAI_API_KEY and PINECONE_API_KEY in .env")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-pc = Pinecone(api_key=PINECONE_API_KEY)
 INDEX_NAME = "capri-index"
-index = pc.Index(INDEX_NAME)
 
 app = Flask(__name__)
 
+# Clients are created lazily on first use so each gunicorn worker builds its own
+# connections after fork instead of inheriting them from the master process.
+@lru_cache(maxsize=1)
+def get_client():
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+@lru_cache(maxsize=1)
+def get_index():
+    return Pinecone(api_key=PINECONE_API_KEY).Index(INDEX_NAME)
+
+@lru_cache(maxsize=4096)
 def embed_query(q):
-    resp = client.embeddings.create(model="text-embedding-3-small", input=q)
-    return resp.data[0].embedding
+    # Cached per process; returned as a tuple so cached vectors can't be mutated by callers
+    resp = get_client().embeddings.create(model="text-embedding-3-small", input=q)
+    return tuple(resp.data[0].embedding)
 
 @app.route("/retrieve", methods=["POST"])
 def retrieve():
@@ -35,8 +47,10 @@ def retrieve():
     k = int(body.get("k", 5))
     if not q:
         return jsonify({"error": "missing 'q' parameter"}), 400
+    if not isinstance(q, str):
+        return jsonify({"error": "'q' must be a string"}), 400
     vec = embed_query(q)
-    resp = index.query(vector=vec, top_k=k, include_metadata=True)
+    resp = get_index().query(vector=list(vec), top_k=k, include_metadata=True)
     results = []
     matches = getattr(resp, "matches", None) or resp.get("matches", [])
     for item in matches:
@@ -45,6 +59,3 @@ def retrieve():
         metadata = getattr(item, "metadata", None) or item.get("metadata")
         results.append({"id": item_id, "score": score, "metadata": metadata})
     return jsonify({"query": q, "results": results})
-
-if __name__ == "__main__":
-    app.run(port=8080, debug=True)
@@ -1,14 +1,16 @@
-from pinecone import Pinecone, ServerlessSpec
+from pinecone import ServerlessSpec
+from pinecone.grpc import PineconeGRPC
 from dotenv import load_dotenv
 import os
-import json
+import orjson
+import numpy as np
 
 # Load .env variables
 load_dotenv()
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 
-# Initialize Pinecone
-pc = Pinecone(api_key=PINECONE_API_KEY)
+# Initialize Pinecone (gRPC client, which supports pipelined async upserts)
+pc = PineconeGRPC(api_key=PINECONE_API_KEY)
 
 # Set index name
 INDEX_NAME = "capri-index"
@@ -26,26 +28,35 @@ if INDEX_NAME not in existing_indexes:
 else:
     print(f"Index '{INDEX_NAME}' already exists")
 
-# Load embeddings from JSONL
-embeddings_file = "embeddings/embeddings.jsonl"
-if not os.path.exists(embeddings_file):
-    raise FileNotFoundError(f"❌ {embeddings_file} not found. Run ingest.py first.")
+# Load embeddings: float16 vectors (.npy) plus id/text metadata (JSONL), in the same order
+vectors_file = "embeddings/vectors.npy"
+metadata_file = "embeddings/metadata.jsonl"
+for path in (vectors_file, metadata_file):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"❌ {path} not found. Run ingest.py first.")
 
 print("Uploading embeddings to Pinecone...")
 
-with open(embeddings_file, "r", encoding="utf-8") as f:
-    vectors = [json.loads(line) for line in f]
+vecs = np.load(vectors_file, mmap_mode="r")
+with open(metadata_file, "rb") as f:
+    records = [orjson.loads(line) for line in f]
+if len(records) != len(vecs):
+    raise ValueError(f"❌ {metadata_file} has {len(records)} rows but {vectors_file} has {len(vecs)}. Re-run ingest.py.")
+ids = [str(r["id"]) for r in records]
+metas = [{"text": r["text"]} for r in records]
 
 index = pc.Index(INDEX_NAME)
 
-# Upload in batches
+# Upload in batches, keeping all upserts in flight and waiting for them at the end
 batch_size = 100
-for i in range(0, len(vectors), batch_size):
-    batch = vectors[i:i + batch_size]
-    ids = [str(v["id"]) for v in batch]
-    embeds = [v["embedding"] for v in batch]
-    metas = [{"text": v["text"]} for v in batch]
-    index.upsert(vectors=zip(ids, embeds, metas))
-    print(f"Upserted batch {i // batch_size + 1}")
+futures = []
+for i in range(0, len(ids), batch_size):
+    embeds = vecs[i:i + batch_size].astype(np.float32).tolist()
+    batch = list(zip(ids[i:i + batch_size], embeds, metas[i:i + batch_size]))
+    futures.append(index.upsert(vectors=batch, async_req=True))
+
+for n, future in enumerate(futures, start=1):
+    future.result()
+    print(f"Upserted batch {n}")
 
 print("✅ Pinecone index updated successfully.")